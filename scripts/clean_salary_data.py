@@ -2,8 +2,15 @@
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.compute as pc
 from pathlib import Path
+from functools import lru_cache
+import codecs
+import io
 import json
+import os
 from datetime import datetime
 import argparse
 import re
@@ -159,16 +166,21 @@ def get_job_title_mapping():
     }
 
 
+def get_reverse_column_mapping():
+    """Map each lowercased column name variation to its standard column name."""
+    reverse_mapping = {}
+    for standard, variations in get_column_mapping().items():
+        for variation in variations:
+            reverse_mapping[variation.lower()] = standard
+    return reverse_mapping
+
 def standardize_column_names(df: pd.DataFrame) -> pd.DataFrame:
     """Standardize column names using predefined mappings."""
     # Store original column names as a copy for schema tracking
     original_columns = df.columns.tolist()
     
     # Create reverse mapping for easier lookup
-    reverse_mapping = {}
-    for standard, variations in get_column_mapping().items():
-        for variation in variations:
-            reverse_mapping[variation.lower()] = standard
+    reverse_mapping = get_reverse_column_mapping()
     
     # Rename columns based on mapping
     rename_dict = {}
@@ -186,6 +198,13 @@ def standardize_column_names(df: pd.DataFrame) -> pd.DataFrame:
     
     return df, original_columns
 
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Curly single quotes → straight, en-dash/em-dash → hyphen
+_SPECIAL_CHAR_TABLE = str.maketrans({"‘": "'", "’": "'", "–": "-", "—": "-"})
+
+_ARTICLE_RE = re.compile(r'\b(?:the|a|an)\b', flags=re.IGNORECASE)
+
 def normalize_text(text: str) -> str:
     """Normalize text by removing extra spaces, standardizing case, and handling special characters."""
     if pd.isna(text):
@@ -194,14 +213,14 @@ def normalize_text(text: str) -> str:
     text = str(text).strip()
     
     # Collapse multiple spaces to a single space
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE_RE.sub(' ', text)
     
     # Handle common special characters
-    text = text.replace("‘", "'").replace("’", "'")   # Curly single quotes → straight
-    text = text.replace("–", "-").replace("—", "-")   # En-dash/em-dash → hyphen
+    text = text.translate(_SPECIAL_CHAR_TABLE)
 
-    # remove non printable char
-    text = ''.join(char for char in text if char.isprintable())
+    # remove non printable char (most values have none, so check the whole string first)
+    if not text.isprintable():
+        text = ''.join(char for char in text if char.isprintable())
     
     text = text.replace('"', '""')
 
@@ -238,7 +257,7 @@ def normalize_job_title(title: str) -> str:
     title = ' '.join(normalized_words)
     
     # Remove any double spaces
-    title = re.sub(r'\s+', ' ', title)
+    title = _WHITESPACE_RE.sub(' ', title)
     
     # Remove any trailing/leading spaces
     title = title.strip()
@@ -259,7 +278,7 @@ def normalize_employer(employer: str) -> str:
     employer = employer.replace('Inc.', 'Incorporated').replace('Inc ', 'Incorporated ')
     
     # Remove common unnecessary words
-    employer = re.sub(r'\b(?:the|a|an)\b', '', employer, flags=re.IGNORECASE)
+    employer = _ARTICLE_RE.sub('', employer)
     
     return employer.strip()
 
@@ -322,8 +341,6 @@ def deduplicate_with_salary_resolution(df):
     Deduplicate rows that have same person/job but different salaries.
     keeps row with higher salary if all else the same.
     """
-    df = df.copy()
-
     # First remove exact duplicates
     original_len = len(df)
     df = df.drop_duplicates()
@@ -331,20 +348,25 @@ def deduplicate_with_salary_resolution(df):
 
     # find groups with non-exact duplicates (differences in salary or benefits)
     group_cols = ['sector', 'first_name', 'last_name', 'employer', 'job_title', 'calendar_year']
-    duplicated_groups = df.groupby(group_cols).size().reset_index(name='count')
-    duplicated_groups = duplicated_groups[duplicated_groups['count'] > 1].copy()
+    # single hashing pass over the key columns; like groupby, keys containing nulls are not counted
+    keys = df[group_cols]
+    in_duplicated_group = keys.duplicated(keep=False) & keys.notna().all(axis=1)
+    duplicated_group_count = int((in_duplicated_group & ~keys.duplicated(keep='first')).sum())
 
-    if len(duplicated_groups) > 0:
+    if duplicated_group_count > 0:
         # keep row with highest total comp
-        df.loc[:, 'total_comp'] = (
+        total_comp = (
             pd.to_numeric(df['salary_paid'], errors='coerce').fillna(0).infer_objects(copy=False) +
             pd.to_numeric(df['taxable_benefits'], errors='coerce').fillna(0).infer_objects(copy=False)
         )
-        df.sort_values('total_comp', ascending=False, inplace=True)
-        df.drop_duplicates(subset=group_cols, inplace=True)
-        df.drop(columns=['total_comp'], inplace=True)
+        df = (
+            df.assign(total_comp=total_comp)
+            .sort_values('total_comp', ascending=False)
+            .drop_duplicates(subset=group_cols)
+            .drop(columns=['total_comp'])
+        )
 
-        non_exact_dupes = len(duplicated_groups)
+        non_exact_dupes = duplicated_group_count
     else:
         non_exact_dupes = 0
 
@@ -353,29 +375,153 @@ def deduplicate_with_salary_resolution(df):
         'non_exact_duplicates_resolved': non_exact_dupes
     }
 
-def clean_sunshine_data(input_path: Path, output_dir: Path):
-    encoding_list = ['utf-8', 'utf-8-sig', 'iso-8859-1', 'cp1252']
-    
-    df = None
+ENCODINGS = ['utf-8', 'utf-8-sig', 'iso-8859-1', 'cp1252']
+ENCODING_SNIFF_BYTES = 64 * 1024
 
-    for encoding in encoding_list:
+def _encoding_from_sample(sample: bytes) -> str:
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # incremental decode so a multi-byte character cut off at the end of the sample isn't an error
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "iso-8859-1"
+
+@lru_cache(maxsize=None)
+def _sniff_encoding(file_path: str, mtime_ns: int) -> str:
+    # mtime_ns is only part of the cache key, so a rewritten file gets sniffed again
+    with open(file_path, "rb") as f:
+        return _encoding_from_sample(f.read(ENCODING_SNIFF_BYTES))
+
+def detect_encoding(file_path) -> str:
+    """Guess a file's encoding from its first 64 KB instead of test-parsing the whole file."""
+    if isinstance(file_path, io.BytesIO):
+        return _encoding_from_sample(bytes(file_path.getbuffer()[:ENCODING_SNIFF_BYTES]))
+    return _sniff_encoding(str(file_path), os.stat(file_path).st_mtime_ns)
+
+def _rewound(file_path):
+    # in-memory files are read several times below, so each read starts from the top
+    if isinstance(file_path, io.BytesIO):
+        file_path.seek(0)
+        return file_path
+    return str(file_path)
+
+def arrow_to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert to pandas with missing values as pd.read_csv gives them: all-empty columns as float64 NaN,
+    and NaN rather than None in string and bool columns.
+    """
+    for i, field in enumerate(table.schema):
+        if pa.types.is_null(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+    df = table.to_pandas()
+    object_cols = [
+        field.name for field in table.schema
+        if (pa.types.is_string(field.type) or pa.types.is_boolean(field.type)) and table[field.name].null_count
+    ]
+    if object_cols:
+        df[object_cols] = df[object_cols].astype(object).fillna(np.nan)
+    return df
+
+def _float_column_differs_from_pandas(column) -> bool:
+    """
+    pyarrow parses "NaN"/"nan" and overflowing text like "1e400" as floats, where pandas (with
+    keep_default_na=False) keeps them as strings, and it reads integers beyond int64 as floats
+    where pandas gives uint64 or strings. Any NaN, inf or value past 2**63 sends the file to pandas.
+    """
+    if pc.any(pc.invert(pc.is_finite(column))).as_py():
+        return True
+    largest = pc.max(pc.abs(column)).as_py()
+    return largest is not None and largest >= 2 ** 63
+
+def _read_csv_arrow(file_path, encoding: str, dtype=None, usecols=None):
+    """
+    Parse with pyarrow's multithreaded reader, matching the pandas read below:
+    only empty fields are null, and dates are kept as the text they were written as.
+    """
+    if usecols is not None and not usecols:
+        # an empty include_columns means every column to pyarrow, but none to pandas
+        raise pa.ArrowInvalid("no requested columns in file")
+    # pyarrow skips a UTF-8 BOM itself
+    arrow_encoding = "utf8" if encoding.startswith("utf-8") else encoding
+    column_types = {col: pa.string() for col, t in (dtype or {}).items() if t is str}
+
+    def read(column_types):
+        return pacsv.read_csv(
+            _rewound(file_path),
+            read_options=pacsv.ReadOptions(encoding=arrow_encoding),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=usecols,
+                column_types=column_types,
+                null_values=[""],
+                strings_can_be_null=True,
+                # pandas' booleans; pyarrow would also read "1"/"0" as bools
+                true_values=["True", "TRUE", "true"],
+                false_values=["False", "FALSE", "false"]
+            )
+        )
+
+    table = read(column_types)
+    if len(set(table.column_names)) != table.num_columns:
+        # pandas de-duplicates repeated headers ("Name", "Name.1"); leave those files to it
+        raise pa.ArrowInvalid("duplicate column names")
+    # casting a parsed timestamp back to text reformats it (and shifts offsets to UTC),
+    # so columns inferred as dates are read again as plain strings
+    temporal = [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+    if temporal:
+        table = read({**column_types, **{col: pa.string() for col in temporal}})
+    for field in table.schema:
+        if pa.types.is_floating(field.type) and _float_column_differs_from_pandas(table[field.name]):
+            raise pa.ArrowInvalid(f"column {field.name} needs pandas' float parsing")
+    return arrow_to_pandas(table)
+
+def load_csv_with_encoding(file_path, dtype=None, usecols=None, on_bad_lines="error"):
+    """
+    Load a CSV (a path, or an io.BytesIO already fetched from GCS) in its sniffed encoding,
+    falling back to the other common encodings in turn.
+    dtype and usecols use standardized column names and are mapped onto the file's own headers.
+    pyarrow parses first; anything it rejects is re-read with pandas, where on_bad_lines applies.
+    """
+    detected = detect_encoding(file_path)
+    encodings = [detected] + [encoding for encoding in ENCODINGS if encoding != detected]
+    for encoding in encodings:
         try:
-            df = pd.read_csv(
-                input_path,
+            read_kwargs = {}
+            if dtype or usecols:
+                header = pd.read_csv(_rewound(file_path), encoding=encoding, nrows=0).columns
+                reverse_mapping = get_reverse_column_mapping()
+                raw_names = {reverse_mapping.get(col.lower(), col): col for col in header}
+                if dtype:
+                    read_kwargs["dtype"] = {raw_names[col]: t for col, t in dtype.items() if col in raw_names}
+                if usecols:
+                    wanted = {raw_names[col] for col in usecols if col in raw_names}
+                    # in file order, which is what pandas' usecols gives back
+                    read_kwargs["usecols"] = [col for col in header if col in wanted]
+            try:
+                return _read_csv_arrow(file_path, encoding, **read_kwargs)
+            except pa.ArrowInvalid:
+                pass
+            # low_memory=False infers each column from the whole file, as pyarrow does, rather than
+            # per chunk, which can leave one column holding a mix of numbers and strings
+            return pd.read_csv(
+                _rewound(file_path),
                 encoding=encoding,
-                engine="python",
-                on_bad_lines="warn",
+                engine="c",
+                low_memory=False,
                 keep_default_na=False,
-                na_values=['']
+                na_values=[''],
+                on_bad_lines=on_bad_lines,
+                **read_kwargs
             )
-            break
         except UnicodeDecodeError:
-            print(f"Failed to read with encoding: {encoding}")
-            continue
-    else:
-        # This block runs if the loop completes without breaking (i.e., all encodings failed)
-        raise ValueError(f"Could not read file {input_path} with any of the attempted encodings: {encodings}")
-        
+            pass
+    raise ValueError(f"Could not read file {file_path} with any of the attempted encodings: {encodings}")
+
+def clean_sunshine_data(input_path: Path, output_dir: Path, strict: bool = False):
+    # malformed rows are skipped with a warning rather than failing the whole file
+    df = load_csv_with_encoding(input_path, on_bad_lines="warn")
+
     if df is None or not isinstance(df, pd.DataFrame):
         print(f"ERROR: CSV read failed or returned invalid type: {type(df)}")
         return
@@ -392,7 +538,7 @@ def clean_sunshine_data(input_path: Path, output_dir: Path):
         print(f"Error: df is not a DataFrame before normalize_data, type: {type(df)}")
         return
     
-    df = normalize_data(df).copy()
+    df = normalize_data(df)
 
     # Define target schema (with forced types)
     target_columns = {
@@ -430,7 +576,14 @@ def clean_sunshine_data(input_path: Path, output_dir: Path):
             print(f"Warning: Column: {col} - not found in DataFrame")
 
     # Create output paths
-    year = df["calendar_year"].dropna().astype(int).mode()[0] if "calendar_year" in df.columns else "unknown"
+    # files are per-year, so the first known year names the output; strict mode checks that assumption
+    if "calendar_year" in df.columns:
+        known_years = df["calendar_year"].dropna()
+        year = int(known_years.iloc[0])
+        if strict and not (known_years == year).all():
+            raise ValueError(f"calendar_year is not uniform in {input_path}: {sorted(known_years.unique())}")
+    else:
+        year = "unknown"
     output_csv = output_dir / f"sunshine_cleaned_{year}.csv"
 
     # Final dedupe
@@ -489,6 +642,11 @@ if __name__ == "__main__":
         default=Path("data/cleaned"),
         help="Directory to save cleaned files"
     )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Fail if calendar_year is not the same on every row"
+    )
     
     args = parser.parse_args()
     
@@ -506,7 +664,7 @@ if __name__ == "__main__":
     print(f"📂 Output directory: {args.output_dir}")
     
     try:
-        clean_sunshine_data(args.input, args.output_dir)
+        clean_sunshine_data(args.input, args.output_dir, strict=args.strict)
     except Exception as e:
         print(f"❌ Error processing file: {e}")
         exit(1) 
\ No newline at end of file
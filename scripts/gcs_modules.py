@@ -1,42 +1,148 @@
 # gcs_modules.py
 
+import io
+import os
 import re
+import base64
+import hashlib
 import tempfile
 from pathlib import Path
 import argparse
-from google.cloud import storage
+
+# the google-cloud packages (and the grpc/auth stack behind them) are imported by the functions
+# that talk to GCS, so --help and argument errors return without loading them
+_CLIENT = None
+
+# larger upload chunks mean fewer round trips per file; must be a multiple of 256 KiB.
+# downloads get no chunk_size: a chunked download skips the checksum, a single streamed GET verifies crc32c
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# above this size a download is split into ranged chunks fetched in parallel
+PARALLEL_DOWNLOAD_THRESHOLD = 32 * 1024 * 1024
+PARALLEL_DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+PARALLEL_DOWNLOAD_WORKERS = 8
+# files fetched side by side by download_gcs_files
+BATCH_DOWNLOAD_WORKERS = 16
+
+_GCS_PATH_RE = re.compile(r"gs://([^/]+)/(.+)")
+
+# 0
+def get_storage_client():
+    """Return one shared storage.Client so auth and the HTTP connection pool are set up once per process"""
+    global _CLIENT
+    if _CLIENT is None:
+        from google.cloud import storage
+        _CLIENT = storage.Client()
+    return _CLIENT
 
 # 1
 def parse_gcs_path(gcs_path):
     """Split gs://bucket/path/to/blob.csv into (bucket, path/to/blob.csv)"""
-    match = re.match(r"gs://([^/]+)/(.+)", gcs_path)
+    match = _GCS_PATH_RE.match(gcs_path)
     if not match:
         raise ValueError(f"Invalid GCS path: {gcs_path}")
     return match.group(1), match.group(2)
 
+def _local_download_path(root, bucket_name, blob_path) -> Path:
+    # one folder per blob path, so same-named files from different prefixes don't collide
+    digest = hashlib.sha1(f"{bucket_name}/{blob_path}".encode()).hexdigest()[:16]
+    local_path = Path(root) / digest / Path(blob_path).name
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    return local_path
+
 # 2
-def download_gcs_file(gcs_uri):
+def download_gcs_file(gcs_uri, root=None):
+    """Download a blob to a local file under root; pass a run-scoped directory so a whole run shares (and cleans up) one"""
     bucket_name, blob_path = parse_gcs_path(gcs_uri)
-    client = storage.Client()
+    client = get_storage_client()
     bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_path)
-    temp_dir = tempfile.mkdtemp()
-    local_path = Path(temp_dir) / Path(blob_path).name
-    blob.download_to_filename(str(local_path))
+    blob = bucket.get_blob(blob_path)
+    if blob is None:
+        raise FileNotFoundError(f"Blob not found: {gcs_uri}")
+    local_path = _local_download_path(root or tempfile.mkdtemp(), bucket_name, blob_path)
+    if blob.size > PARALLEL_DOWNLOAD_THRESHOLD:
+        from google.cloud.storage import transfer_manager
+        transfer_manager.download_chunks_concurrently(
+            blob, str(local_path), chunk_size=PARALLEL_DOWNLOAD_CHUNK_SIZE, max_workers=PARALLEL_DOWNLOAD_WORKERS
+        )
+    else:
+        blob.download_to_filename(str(local_path), checksum="crc32c")
     print(f"> Downloaded {blob_path}")
     return local_path
 
 # 3
 def upload_to_gcs(local_path: Path, gcs_uri: str):
     bucket_name, blob_path = parse_gcs_path(gcs_uri)
-    client = storage.Client()
+    client = get_storage_client()
     bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_path)
-    blob.upload_from_filename(str(local_path))
+    blob = bucket.blob(blob_path, chunk_size=UPLOAD_CHUNK_SIZE)
+    if blob_matches_local(blob, local_path):
+        print(f"> Skipped {blob_path}, already up to date")
+        return
+    blob.upload_from_filename(str(local_path), checksum="crc32c")
 
 # 4
 def gcs_blob_exists(gcs_uri: str) -> bool:
     bucket_name, blob_path = parse_gcs_path(gcs_uri)
-    client = storage.Client()
+    client = get_storage_client()
     bucket = client.bucket(bucket_name)
-    return bucket.blob(blob_path).exists()
\ No newline at end of file
+    return bucket.blob(blob_path).exists()
+
+# 5
+def list_merged_files(bucket_name, prefix="merged/"):
+    client = get_storage_client()
+    blobs = client.list_blobs(bucket_name, prefix=prefix)
+    return [blob.name for blob in blobs if blob.name.endswith(".csv") and "merged_salary" in blob.name]
+
+# 6
+def blob_matches_local(blob, local_path) -> bool:
+    """True if the blob already exists with the same size and crc32c as the local file, so re-runs can skip it"""
+    from google.api_core.exceptions import NotFound
+    import google_crc32c
+    try:
+        blob.reload()
+    except NotFound:
+        return False
+    if blob.size != os.path.getsize(local_path):
+        return False
+    checksum = google_crc32c.Checksum()
+    with open(local_path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            checksum.update(chunk)
+    return base64.b64encode(checksum.digest()).decode("utf-8") == blob.crc32c
+
+# 7
+def download_gcs_bytes(gcs_uri, generation=None) -> io.BytesIO:
+    """
+    Fetch a blob straight into memory, for files that are read once and don't need a temp copy.
+    With generation set, the download fails rather than return a newer upload of the object.
+    """
+    bucket_name, blob_path = parse_gcs_path(gcs_uri)
+    blob = get_storage_client().bucket(bucket_name).blob(blob_path)
+    data = io.BytesIO(blob.download_as_bytes(checksum="crc32c", if_generation_match=generation))
+    print(f"> Downloaded {blob_path}")
+    return data
+
+# 8
+def download_gcs_files(gcs_uris, root=None):
+    """Download several blobs in one transfer_manager batch sharing one worker pool; returns local paths in input order"""
+    from google.cloud.storage import transfer_manager
+    client = get_storage_client()
+    root = root or tempfile.mkdtemp()
+    blob_file_pairs = []
+    local_paths = []
+    for gcs_uri in gcs_uris:
+        bucket_name, blob_path = parse_gcs_path(gcs_uri)
+        local_path = _local_download_path(root, bucket_name, blob_path)
+        blob_file_pairs.append((client.bucket(bucket_name).blob(blob_path), str(local_path)))
+        local_paths.append(local_path)
+    transfer_manager.download_many(
+        blob_file_pairs,
+        download_kwargs={"checksum": "crc32c"},
+        max_workers=BATCH_DOWNLOAD_WORKERS,
+        worker_type=transfer_manager.THREAD,
+        raise_exception=True
+    )
+    for blob, _ in blob_file_pairs:
+        print(f"> Downloaded {blob.name}")
+    return local_paths
@@ -2,11 +2,16 @@
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from pathlib import Path
 import json
 import re
 import argparse
-from clean_salary_data import standardize_column_names, normalize_text, normalize_data
+from clean_salary_data import (
+    standardize_column_names, normalize_text, normalize_data,
+    deduplicate_with_salary_resolution, load_csv_with_encoding
+)
 
 def get_status_mapping():
     """Define standard status values in addendum
@@ -37,71 +42,76 @@ def normalize_status_col(status: str) -> str:
         if normalized_status in normalized_synonyms:
             return standard
 
-def load_csv_with_encoding(file_path: Path):
-    encodings = ['utf-8', 'utf-8-sig', 'iso-8859-1', 'cp1252']
-    for encoding in encodings:
-        try:
-            return pd.read_csv(file_path, encoding=encoding, keep_default_na=False, na_values=[''])
-        except UnicodeDecodeError:
-            pass
-    raise ValueError(f"Could not read file {file_path} with any of the attempted encodings: {encodings}")
+# text columns read as plain strings so pandas skips type inference on them
+TEXT_COLUMN_DTYPES = {
+    "sector": str,
+    "first_name": str,
+    "last_name": str,
+    "employer": str,
+    "job_title": str,
+    "status": str
+}
+
+def write_merged_csv(df, output_file: Path):
+    """Write the merged CSV with Arrow's multithreaded writer; mixed-type columns fall back to pandas."""
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        df.to_csv(output_file, index=False)
+        return
+    pacsv.write_csv(table, str(output_file))
 
 def standardize_columns_only(df):
     df_standardized, _ = standardize_column_names(df)
     return df_standardized
 
-def deduplicate_with_salary_resolution(df):
+KEY_TEXT_COLUMNS = ["first_name", "last_name", "employer", "job_title"]
+
+def build_keys(df):
     """
-    Deduplicate rows that have same person/job but different salaries.
-    keeps row with higher salary if all else the same.
+    Match key per row: normalized first/last name, employer and job title plus the year, hashed into one uint64.
+    Integer keys take pandas' fast hashtable path in isin/merge; a collision is a 1 in 2^64 chance.
     """
-    df = df.copy()
-
-    # First remove exact duplicates
-    original_len = len(df)
-    df = df.drop_duplicates()
-    exact_dupes = original_len - len(df)
-
-    # find groups with non-exact duplicates (differences in salary or benefits)
-    group_cols = ['sector', 'first_name', 'last_name', 'employer', 'job_title', 'calendar_year']
-    duplicated_groups = df.groupby(group_cols).size().reset_index(name='count')
-    duplicated_groups = duplicated_groups[duplicated_groups['count'] > 1].copy()
-
-    if len(duplicated_groups) > 0:
-        # keep row with highest total comp
-        df.loc[:, 'total_comp'] = (
-            pd.to_numeric(df['salary_paid'], errors='coerce').fillna(0).infer_objects(copy=False) +
-            pd.to_numeric(df['taxable_benefits'], errors='coerce').fillna(0).infer_objects(copy=False)
-        )
-        df.sort_values('total_comp', ascending=False, inplace=True)
-        df.drop_duplicates(subset=group_cols, inplace=True)
-        df.drop(columns=['total_comp'], inplace=True)
-
-        non_exact_dupes = len(duplicated_groups)
+    parts = {}
+    for col in KEY_TEXT_COLUMNS:
+        values = df[col].astype(str) if col in df.columns else pd.Series("", index=df.index)
+        # normalize each distinct value once instead of once per row
+        uniques = values.unique()
+        parts[col] = values.map(dict(zip(uniques, map(normalize_text, uniques))))
+    # 2019 and 2019.0 should give the same key
+    if "calendar_year" in df.columns:
+        parts["calendar_year"] = pd.to_numeric(df["calendar_year"], errors="coerce").astype("Int64").astype(str)
     else:
-        non_exact_dupes = 0
-
-    return df, {
-        'exact_duplicates_removed': exact_dupes,
-        'non_exact_duplicates_resolved': non_exact_dupes
-    }
-
-def match_key(row):
-    return (
-        normalize_text(str(row.get("first_name", ""))),
-        normalize_text(str(row.get("last_name", ""))),
-        normalize_text(str(row.get("employer", ""))),
-        normalize_text(str(row.get("job_title", ""))),
-        row.get("calendar_year")
-    )
+        parts["calendar_year"] = pd.Series("<NA>", index=df.index)
+    return pd.util.hash_pandas_object(pd.DataFrame(parts, index=df.index), index=False)
 
-def compare_rows(row1, row2):
+def identical_to_salary(change_df, salary_df):
+    """
+    For each change row, whether some salary row with the same _match_key has equal values
+    in every compared column. As with ==, NaN never counts as equal.
+    """
     cols_to_compare = [
         'first_name', 'last_name', 'employer', 'job_title',
         'calendar_year', 'salary_paid', 'taxable_benefits'
     ]
-    return all(row1.get(col) == row2.get(col) for col in cols_to_compare)
-
+    if any((col in change_df.columns) != (col in salary_df.columns) for col in cols_to_compare):
+        # a column only one side has can never match, so no change row is identical
+        return np.zeros(len(change_df), dtype=bool)
+    cols = [col for col in cols_to_compare if col in change_df.columns]
+    on = ["_match_key"] + cols
+
+    probe = change_df[on].reset_index(drop=True)
+    base = salary_df[on].dropna(subset=cols).drop_duplicates()
+    # merge refuses some mixed-dtype joins; as objects, values compare the way == does (2019 == 2019.0)
+    for col in cols:
+        if probe[col].dtype != base[col].dtype:
+            probe[col] = probe[col].astype(object)
+            base[col] = base[col].astype(object)
+
+    hits = probe.reset_index().merge(base, on=on, how="inner")["index"].to_numpy()
+    identical = np.zeros(len(change_df), dtype=bool)
+    identical[hits] = True
+    return identical
 
 def merge_addendum(salary_path: Path, addendum_path: Path, output_path: Path):
     """
@@ -109,8 +119,8 @@ def merge_addendum(salary_path: Path, addendum_path: Path, output_path: Path):
     """
     # Load the base salary
     print(f"\nLoading salary file: {salary_path}")
-    salary_df = load_csv_with_encoding(salary_path)
-    salary_df = standardize_columns_only(salary_df.copy())
+    salary_df = load_csv_with_encoding(salary_path, dtype=TEXT_COLUMN_DTYPES)
+    salary_df = standardize_columns_only(salary_df)
 
     # Deduplicate salary file
     print("Deduplicating salary file...")
@@ -118,20 +128,22 @@ def merge_addendum(salary_path: Path, addendum_path: Path, output_path: Path):
     print(f"- Removed {salary_dedup_stats['exact_duplicates_removed']} exact duplicates")
     print(f"- Resolved {salary_dedup_stats['non_exact_duplicates_resolved']} non-exact duplicates")
 
+    # files are per-year, so the output year is taken once from the base salary file
+    year = int(salary_df["calendar_year"].mode()[0])
+
     # If addendum doesn’t exist, just pass the base file through
     if not addendum_path.exists():
         print("Addendum file not found; outputting the base file unchanged.")
         output_path.mkdir(parents=True, exist_ok=True)
-        year = int(salary_df["calendar_year"].mode()[0])
         final_file = output_path / f"merged_salary_{year}_uncleaned.csv"
-        salary_df.to_csv(final_file, index=False)
+        write_merged_csv(salary_df, final_file)
         print(f"Saved merged file: {final_file}")
         return
 
     # Load & standardize addendum
     print(f"\nLoading addendum file: {addendum_path}")
-    addendum_df = load_csv_with_encoding(addendum_path)
-    addendum_df = standardize_columns_only(addendum_df.copy())
+    addendum_df = load_csv_with_encoding(addendum_path, dtype=TEXT_COLUMN_DTYPES)
+    addendum_df = standardize_columns_only(addendum_df)
 
     # Deduplicate addendum
     print("Deduplicating addendum file...")
@@ -151,19 +163,26 @@ def merge_addendum(salary_path: Path, addendum_path: Path, output_path: Path):
     if not status_col:
         print("❌ No status column found in addendum; outputting base file unchanged.")
         output_path.mkdir(parents=True, exist_ok=True)
-        year = int(salary_df["calendar_year"].mode()[0])
         final_file = output_path / f"merged_salary_{year}_uncleaned.csv"
-        salary_df.to_csv(final_file, index=False)
+        write_merged_csv(salary_df, final_file)
         print(f"Saved merged file: {final_file}")
         return
 
     # standardize status col in addendum
-    addendum_df['status'] = addendum_df['status'].apply(normalize_status_col)
+    # there are only a handful of distinct raw statuses, so normalize each once and keep the result categorical
+    raw_status = addendum_df[status_col]
+    raw_uniques = raw_status.dropna().unique()
+    status = raw_status.map(dict(zip(raw_uniques, map(normalize_status_col, raw_uniques)))).astype("category")
+    addendum_df[status_col] = status
+
+    unexpected_status = raw_status[raw_status.notna() & status.isna()]
+    if len(unexpected_status) > 0:
+        print(f"Ignoring {len(unexpected_status)} addendum row(s) with unrecognized status: {sorted(unexpected_status.unique())}")
 
-    # Split addendum into 3 dfs by operation type
-    to_add = addendum_df[addendum_df[status_col].str.lower() == 'addition'].copy()
-    to_delete = addendum_df[addendum_df[status_col].str.lower() == 'deletion'].copy()
-    to_change = addendum_df[addendum_df[status_col].str.lower() == 'changed'].copy()
+    # Split addendum into 3 dfs by operation type (categorical compares are integer code checks)
+    to_add = addendum_df[status.eq('addition')]
+    to_delete = addendum_df[status.eq('deletion')]
+    to_change = addendum_df[status.eq('changed')]
 
     print("\nApplying addendum operations:")
     print(f"Salary file rows: {len(salary_df)}")
@@ -176,46 +195,49 @@ def merge_addendum(salary_path: Path, addendum_path: Path, output_path: Path):
         "changes_applied": 0
     }
     
-    salary_df["_match_key"] = salary_df.apply(match_key, axis=1)
+    salary_df["_match_key"] = build_keys(salary_df)
 
     # Deletions
     if not to_delete.empty:
-        to_delete["_match_key"] = to_delete.apply(match_key, axis=1)
+        to_delete = to_delete.assign(_match_key=build_keys(to_delete))
         delete_keys = set(to_delete["_match_key"]) # set of keys to delete
         salary_df = salary_df[~salary_df["_match_key"].isin(delete_keys)]
 
     # Changes
-    # If it finds an exact match (using compare_rows func), it skips the change. 
+    # If it finds an exact match (same values in every compared column), it skips the change. 
     # If it finds a match based on _match_key but the rows are different, it removes the old and adds the new. 
     # If no match is found, it treats it as an addition.
     if not to_change.empty:
-        to_change["_match_key"] = to_change.apply(match_key, axis=1)
-        skipped_changes = []
-        needed_changes = []
-
-        for _, change_row in to_change.iterrows():
-            matching_base_rows = salary_df[salary_df["_match_key"] == change_row["_match_key"]]
-            if len(matching_base_rows) > 0:
-                # If row is identical, skip. Else remove old row + add new row
-                if any(compare_rows(change_row, row) for _, row in matching_base_rows.iterrows()):
-                    skipped_changes.append(change_row)
-                else:
-                    needed_changes.append(change_row)
-                    salary_df = salary_df[salary_df["_match_key"] != change_row["_match_key"]]
-            else:
-                # No match => treat as new addition
-                needed_changes.append(change_row)
-
-        if skipped_changes:
-            print(f"Skipping {len(skipped_changes)} change(s) that match salary data exactly.")
-
-        if needed_changes:
-            print(f"Applying {len(needed_changes)} valid change(s).")
-            needed_changes_df = pd.DataFrame(needed_changes)
+        to_change = to_change.assign(_match_key=build_keys(to_change))
+        change_keys = to_change["_match_key"]
+
+        # present: the key exists in the salary file
+        # identical: the change row equals one of the salary rows under that key
+        present = change_keys.isin(salary_df["_match_key"]).to_numpy()
+        identical = identical_to_salary(to_change, salary_df)
+
+        # Rows are resolved in file order: identical rows are skipped until the first differing row
+        # for a key, which replaces the old salary rows; from then on every row for that key is applied.
+        differs = present & ~identical
+        differs_so_far = pd.Series(differs).groupby(pd.factorize(change_keys)[0]).cumsum().to_numpy()
+        needed = ~present | (differs_so_far > 0)
+        skipped_count = int((~needed).sum())
+        needed_count = int(needed.sum())
+
+        replaced_keys = change_keys[differs].unique()
+        if len(replaced_keys):
+            salary_df = salary_df[~salary_df["_match_key"].isin(replaced_keys)]
+
+        if skipped_count:
+            print(f"Skipping {skipped_count} change(s) that match salary data exactly.")
+
+        if needed_count:
+            print(f"Applying {needed_count} valid change(s).")
+            needed_changes_df = to_change[needed]
             salary_df = pd.concat([salary_df, needed_changes_df], ignore_index=True)
 
-        changes_metadata["changes_skipped"] = len(skipped_changes)
-        changes_metadata["changes_applied"] = len(needed_changes)
+        changes_metadata["changes_skipped"] = skipped_count
+        changes_metadata["changes_applied"] = needed_count
 
     # Additions
     if not to_add.empty:
@@ -234,9 +256,8 @@ def merge_addendum(salary_path: Path, addendum_path: Path, output_path: Path):
     print(f"\nFinal deduplication removed {final_removed} rows total")
 
     # Save merged CSV
-    year = int(salary_df["calendar_year"].mode()[0])
     output_file = output_path / f"merged_salary_{year}_uncleaned.csv"
-    salary_df.to_csv(output_file, index=False)
+    write_merged_csv(salary_df, output_file)
     print(f"\n✅ Merged file saved: {output_file}")
 
 if __name__ == "__main__":
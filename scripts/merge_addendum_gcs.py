@@ -4,56 +4,68 @@ import re
 import tempfile
 from pathlib import Path
 import argparse
-from google.cloud import storage
-from gcs_modules import parse_gcs_path, download_gcs_file, upload_to_gcs, gcs_blob_exists
+from gcs_modules import get_storage_client, parse_gcs_path, download_gcs_files, upload_to_gcs
 from merge_addendum import merge_addendum
 
+SALARY_FILE_RE = re.compile(r"sunshine_salaries_(\d{4})\.csv")
+ADDENDUM_FILE_RE = re.compile(r"sunshine_addendums_(\d{4})\.csv")
+MERGED_FILE_RE = re.compile(r"merged_salary_(\d{4})_uncleaned\.csv")
+
 def list_years(bucket_name, prefix, pattern):
-    client = storage.Client()
+    client = get_storage_client()
     blobs = client.list_blobs(bucket_name, prefix=prefix)
     years = set()
     for blob in blobs:
-        match = re.search(pattern, blob.name)
+        match = pattern.search(blob.name)
         if match:
             years.add(match.group(1))
     return sorted(years)
 
 def main(bucket_name):
     # Extract available years from salary and addendum files
-    salary_years = list_years(bucket_name, "raw/salaries/", r"sunshine_salaries_(\d{4})\.csv")
+    salary_years = list_years(bucket_name, "raw/salaries/", SALARY_FILE_RE)
+    # list existing outputs and addendums once instead of probing each year's blob
+    addendum_years = set(list_years(bucket_name, "raw/addendums/", ADDENDUM_FILE_RE))
+    merged_years = set(list_years(bucket_name, "merged/", MERGED_FILE_RE))
 
     print(f"Salary files found: {salary_years}")
 
+    pending_years = []
     for year in salary_years:
-        print(f"\nProcessing year {year}...")
-        salary_uri = f"gs://{bucket_name}/raw/salaries/sunshine_salaries_{year}.csv"
-        addendum_uri = f"gs://{bucket_name}/raw/addendums/sunshine_addendums_{year}.csv"
         output_uri = f"gs://{bucket_name}/merged/merged_salary_{year}_uncleaned.csv"
-
-        if gcs_blob_exists(output_uri):
+        if year in merged_years:
             print(f"⏭️ Skipping year {year} — merged file already exists at {output_uri}")
-            continue
+        else:
+            pending_years.append(year)
 
-        # check if addendum exists
-        addendum_exists = gcs_blob_exists(addendum_uri)
+    # inputs and outputs live in one run directory, removed once every year is uploaded
+    with tempfile.TemporaryDirectory() as run_dir:
+        # fetch every input up front in one batch, then merge year by year from local files
+        uris = {}
+        for year in pending_years:
+            uris[(year, "salary")] = f"gs://{bucket_name}/raw/salaries/sunshine_salaries_{year}.csv"
+            if year in addendum_years:
+                uris[(year, "addendum")] = f"gs://{bucket_name}/raw/addendums/sunshine_addendums_{year}.csv"
+        local_paths = dict(zip(uris, download_gcs_files(list(uris.values()), run_dir)))
 
-        salary_path = download_gcs_file(salary_uri)
+        for year in pending_years:
+            print(f"\nProcessing year {year}...")
+            output_uri = f"gs://{bucket_name}/merged/merged_salary_{year}_uncleaned.csv"
+            salary_path = local_paths[(year, "salary")]
 
-        # download addendum (if it exists), else set to dummy path
-        addendum_path = Path("non_existent_addendum.csv")
-        if addendum_exists:
-            addendum_path = download_gcs_file(addendum_uri)
-        else:
-            print(f"No addendum found for {year}, passing salary file through unchanged")
+            # use the downloaded addendum (if it exists), else a dummy path
+            addendum_path = local_paths.get((year, "addendum"), Path("non_existent_addendum.csv"))
+            if (year, "addendum") not in local_paths:
+                print(f"No addendum found for {year}, passing salary file through unchanged")
         
-        output_dir = Path(tempfile.mkdtemp())
+            output_dir = Path(tempfile.mkdtemp(dir=run_dir))
 
-        # Call the local merge logic from merge_addendum.py
-        merge_addendum(salary_path, addendum_path, output_dir)
+            # Call the local merge logic from merge_addendum.py
+            merge_addendum(salary_path, addendum_path, output_dir)
 
-        output_file = output_dir / f"merged_salary_{year}_uncleaned.csv"
-        upload_to_gcs(output_file, output_uri)
-        print(f"📤 Uploaded merged file to GCS: {output_uri}")
+            output_file = output_dir / f"merged_salary_{year}_uncleaned.csv"
+            upload_to_gcs(output_file, output_uri)
+            print(f"📤 Uploaded merged file to GCS: {output_uri}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from clean_salary_data import load_csv_with_encoding
+
+class TestLoadCsvMatchesPandas(unittest.TestCase):
+    """load_csv_with_encoding parses with pyarrow first; the frame must match the plain pandas read."""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def assert_matches_pandas(self, text):
+        path = os.path.join(self.tempdir.name, "input.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        expected = pd.read_csv(path, keep_default_na=False, na_values=[""])
+        pd.testing.assert_frame_equal(load_csv_with_encoding(path), expected)
+
+    def test_all_empty_column_is_float_nan(self):
+        self.assert_matches_pandas("name,empty\nA,\nB,\n")
+
+    def test_nan_text_stays_a_string(self):
+        self.assert_matches_pandas("name,salary\nA,1.5\nB,NaN\nC,nan\n")
+
+    def test_one_and_zero_are_not_booleans(self):
+        self.assert_matches_pandas("name,flag\nA,1\nB,0\nC,True\n")
+
+    def test_true_false_column_with_blank(self):
+        self.assert_matches_pandas("name,flag\nA,True\nB,\nC,False\n")
+
+    def test_integer_beyond_int64(self):
+        self.assert_matches_pandas("name,id\nA,1\nB,18446744073709551615\n")
+
+    def test_integer_beyond_uint64(self):
+        self.assert_matches_pandas("name,id\nA,1\nB,99999999999999999999\n")
+
+    def test_overflowing_float_text(self):
+        self.assert_matches_pandas("name,salary\nA,1.5\nB,1e400\n")
+
+    def test_ordinary_salary_rows(self):
+        self.assert_matches_pandas(
+            "Sector,Last Name,First Name,Salary Paid,Taxable Benefits,Employer,Job Title,Calendar Year\n"
+            "Hospitals,Ng,Mary,\"$166,864.15\",$0.00,Hydro One Inc.,Engineer,2019\n"
+            "Universities,Roy,Bob,120000.5,,Univ. of Waterloo,Professor,2019\n"
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from merge_addendum import merge_addendum
+
+HEADER = "Sector,Last Name,First Name,Salary Paid,Taxable Benefits,Employer,Job Title,Calendar Year"
+
+SALARY_CSV = f"""{HEADER}
+Hospitals,Ng,Mary,100000,500,Hydro One,Engineer,2019
+Municipalities,Roy,Bob,110000,600,City of Toronto,Clerk,2019
+Universities,Lee,John,90000,400,University of Waterloo,Professor,2019
+Municipalities,Smith,Ann,80000,300,City of Toronto,Analyst,2019
+"""
+
+# Rows sharing a person/job differ in sector, so the addendum's own dedup keeps them all
+# (the match key leaves sector out).
+ADDENDUM_CSV = f"""{HEADER},Status
+Hospitals,Ng,Mary,100000,500,Hydro One,Engineer,2019,Changed
+Electricity,Ng,Mary,105000,500,Hydro One,Engineer,2019,Changed
+Universities,Lee,John,90000,400,University of Waterloo,Professor,2019,Changed
+Municipalities,Roy,Bob,120000,600,City of Toronto,Clerk,2019,Changed
+Crown Agencies,Roy,Bob,115000,600,City of Toronto,Clerk,2019,Changed
+Municipalities,Smith,Ann,80000,300,City of Toronto,Analyst,2019,Deleted
+Crown Agencies,Smith,Ann,85000,300,City of Toronto,Analyst,2019,Added
+Colleges,New,Zoe,70000,100,Seneca College,Lecturer,2019,Changed
+Colleges,New,Pat,75000,100,Seneca College,Lecturer,2019,Transferred
+"""
+
+# Mary: the identical change is skipped, the differing one that follows replaces her salary row
+# John: identical change only, so his salary row stays
+# Bob:  two differing changes for one key; the first replaces the salary row and both are kept
+# Ann:  deleted, then re-added
+# Zoe:  a change with no salary row is applied as an addition
+# Pat:  unknown status, ignored
+EXPECTED_ROWS = [
+    ("Universities", "Lee", "John", 90000, 400, "University of Waterloo", "Professor", 2019),
+    ("Electricity", "Ng", "Mary", 105000, 500, "Hydro One", "Engineer", 2019),
+    ("Municipalities", "Roy", "Bob", 120000, 600, "City of Toronto", "Clerk", 2019),
+    ("Crown Agencies", "Roy", "Bob", 115000, 600, "City of Toronto", "Clerk", 2019),
+    ("Colleges", "New", "Zoe", 70000, 100, "Seneca College", "Lecturer", 2019),
+    ("Crown Agencies", "Smith", "Ann", 85000, 300, "City of Toronto", "Analyst", 2019),
+]
+
+class TestMergeAddendumChanges(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tempdir.name)
+        (self.root / "salary.csv").write_text(SALARY_CSV, encoding="utf-8")
+        (self.root / "addendum.csv").write_text(ADDENDUM_CSV, encoding="utf-8")
+        self.output_dir = self.root / "out"
+        self.output_dir.mkdir()
+
+        self.stdout = io.StringIO()
+        with contextlib.redirect_stdout(self.stdout):
+            merge_addendum(self.root / "salary.csv", self.root / "addendum.csv", self.output_dir)
+        self.merged = pd.read_csv(self.output_dir / "merged_salary_2019_uncleaned.csv")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_merged_rows(self):
+        columns = [
+            "sector", "last_name", "first_name", "salary_paid", "taxable_benefits",
+            "employer", "job_title", "calendar_year"
+        ]
+        expected = pd.DataFrame(EXPECTED_ROWS, columns=columns)
+        # the final dedup may reorder rows, so compare them sorted
+        actual = self.merged[columns].sort_values(columns).reset_index(drop=True)
+        expected = expected.sort_values(columns).reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, expected)
+
+    def test_change_counts(self):
+        output = self.stdout.getvalue()
+        self.assertIn("Skipping 2 change(s) that match salary data exactly.", output)
+        self.assertIn("Applying 4 valid change(s).", output)
+
+    def test_unknown_status_reported(self):
+        self.assertIn("Ignoring 1 addendum row(s) with unrecognized status: ['Transferred']", self.stdout.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,11 +2,34 @@
 
 from google.cloud import storage
 from pathlib import Path
+from functools import lru_cache
+from itertools import chain
+import multiprocessing
+import os
 import re
 
+from gcs_modules import UPLOAD_CHUNK_SIZE, blob_matches_local
+
+_YEAR_RE = re.compile(r"(20\d{2}|19\d{2})")
+
+# storage.Client isn't fork-safe, so each worker process builds its own in _init_client
+_CLIENT = None
+
+def _init_client():
+    global _CLIENT
+    _CLIENT = storage.Client()
+
+@lru_cache(maxsize=None)
+def _get_bucket(bucket_name: str) -> storage.Bucket:
+    # one Bucket handle per worker, reused across every file it uploads;
+    # called outside the pool there is no initializer, so build the client here
+    if _CLIENT is None:
+        _init_client()
+    return _CLIENT.bucket(bucket_name)
+
 def extract_year(filename:str) -> str:
 
-    match = re.search(r"(20\d{2}|19\d{2})", filename)
+    match = _YEAR_RE.search(filename)
     if match:
         return match.group(1)
     else:
@@ -21,32 +44,60 @@ def upload_to_gcs(bucket_name: str, source_file_path: str, destination_blob_name
         source_file_path (str): Local path to the file.
         destination_blob_name (str): Desired GCS path (e.g. 'raw/2023/sunshine.csv').
     """
-    # Create GCS client (uses GOOGLE_APPLICATION_CREDENTIALS env variable)
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(destination_blob_name)
+    blob = _get_bucket(bucket_name).blob(destination_blob_name, chunk_size=UPLOAD_CHUNK_SIZE)
+    if blob_matches_local(blob, source_file_path):
+        print(f"⏭️ Skipped {source_file_path}, gs://{bucket_name}/{destination_blob_name} is already up to date")
+        return
 
-    blob.upload_from_filename(source_file_path)
+    blob.upload_from_filename(source_file_path, checksum="crc32c")
     print(f"✅ Uploaded {source_file_path} to gs://{bucket_name}/{destination_blob_name}")
 
-def standardize_and_upload(folder: Path, category: str, bucket_name: str):
-    for file in folder.glob("*.csv"):
-        try:
-            year = extract_year(file.name.strip())
+def _upload_one(task):
+    """Pool worker: upload one (bucket_name, source, destination) task and report instead of raising."""
+    bucket_name, source_file_path, destination_blob_name = task
+    try:
+        upload_to_gcs(bucket_name, source_file_path, destination_blob_name)
+        return task, None
+    except Exception as e:
+        return task, str(e)
+
+def standardize_upload_tasks(folder: Path, category: str, bucket_name: str):
+    """
+    Yield (bucket_name, source, destination) tasks for the CSVs in folder.
+    scandir entries carry their own file type, so no extra stat() per file, and being a generator
+    lets the pool start uploading while the directory is still being read.
+    """
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not (entry.name.endswith(".csv") and entry.is_file()):
+                continue
+            try:
+                year = extract_year(entry.name.strip())
+            except ValueError as e:
+                print(e)
+                continue
             standardized_name = f"sunshine_{category}_{year}.csv"
-            destination_blob = f"raw/{category}/{standardized_name}"
-            upload_to_gcs(bucket_name, str(file), destination_blob)
-        except ValueError as e:
-            print(e)
+            yield bucket_name, entry.path, f"raw/{category}/{standardized_name}"
+
+def upload_all(tasks):
+    # separate processes sidestep the client's threading bottleneck past ~10 threads
+    processes = min(32, (os.cpu_count() or 1) * 4)
+    with multiprocessing.Pool(processes=processes, initializer=_init_client) as pool:
+        for (bucket_name, source, destination), error in pool.imap_unordered(_upload_one, tasks, chunksize=4):
+            if error is not None:
+                print(f"❌ Failed to upload {source} to gs://{bucket_name}/{destination}: {error}")
 
 if __name__ == "__main__":
     # GCS bucket name
     bucket_name = "sunshine-list-bucket"
-    
+
     # Base paths for data
     salary_path = Path("/home/aguan/ontario-sunshine-salary-dashboard/data/raw/salaries")
     addendum_path = Path("/home/aguan/ontario-sunshine-salary-dashboard/data/raw/addendums")
-    
+
     # Upload files
-    standardize_and_upload(salary_path, category="salaries", bucket_name=bucket_name)
-    standardize_and_upload(addendum_path, category="addendums", bucket_name=bucket_name)
+    tasks = chain(
+        standardize_upload_tasks(salary_path, category="salaries", bucket_name=bucket_name),
+        standardize_upload_tasks(addendum_path, category="addendums", bucket_name=bucket_name)
+    )
+    upload_all(tasks)
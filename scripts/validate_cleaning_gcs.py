@@ -2,12 +2,15 @@
 
 import os
 import re
+import io
 import json
-import tempfile
 from pathlib import Path
-from google.cloud import storage
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
+from gcs_modules import get_storage_client
+
 REQUIRED_COLUMNS = [
     "sector", "first_name", "last_name", "employer", "job_title",
     "calendar_year", "salary_paid", "taxable_benefits"
@@ -31,70 +34,137 @@ NON_NULL_COLS = {
 BUCKET_NAME = "sunshine-list-bucket"
 MERGED_PREFIX = "merged/"
 CLEANED_PREFIX = "cleaned/"
+ERRORS_PREFIX = "validation_errors/"
+MAX_YEAR_WORKERS = 8
+MAX_REPORTED_ROWS = 20
 
-client = storage.Client()
-bucket = client.bucket(BUCKET_NAME)
-
-def list_gcs_files(prefix):
-    return [blob.name for blob in bucket.list_blobs(prefix=prefix) if blob.name.endswith(".csv")]
+_YEAR4_RE = re.compile(r"(\d{4})")
 
-def download_blob_to_tempfile(blob_path):
-    blob = bucket.blob(blob_path)
-    temp_dir = tempfile.mkdtemp()
-    local_path = Path(temp_dir) / Path(blob_path).name
-    blob.download_to_filename(str(local_path))
-    return local_path
+def get_bucket():
+    # shared with the other GCS scripts via gcs_modules, and not built at import time
+    return get_storage_client().bucket(BUCKET_NAME)
 
-def validate_file(cleaned_path: Path, merged_path: Path):
-    cleaned_df = pd.read_csv(cleaned_path)
-    merged_df = pd.read_csv(merged_path)
+def list_gcs_files(prefix):
+    return [blob.name for blob in get_bucket().list_blobs(prefix=prefix) if blob.name.endswith(".csv")]
+
+def download_blob_to_buffer(blob_path):
+    # files are read once, so keep them in memory rather than round-tripping through a temp dir
+    # no chunk_size, so the download is one streamed GET and the crc32c check actually runs
+    blob = get_bucket().blob(blob_path)
+    return io.BytesIO(blob.download_as_bytes(checksum="crc32c"))
+
+def read_required_columns(buf: io.BytesIO):
+    """
+    Parse only the validated columns, using the multithreaded pyarrow reader.
+    usecols must exist in the file, so the header is read first and missing columns are left for the column check.
+    dtypes are left to inference on purpose: forcing them would hide the dtype mismatches we check for.
+    """
+    header = pd.read_csv(buf, nrows=0).columns
+    buf.seek(0)
+    usecols = [col for col in REQUIRED_COLUMNS if col in header]
+    return pd.read_csv(buf, engine="pyarrow", usecols=usecols)
+
+def upload_error_rows(bad_rows_df, year):
+    # the full set of failing rows goes to parquet in GCS; the log only gets a capped preview
+    buf = io.BytesIO()
+    bad_rows_df.to_parquet(buf, engine="pyarrow", compression="zstd")
+    blob_path = f"{ERRORS_PREFIX}{year}.parquet"
+    get_bucket().blob(blob_path).upload_from_string(buf.getvalue(), content_type="application/octet-stream")
+    return f"gs://{BUCKET_NAME}/{blob_path}"
+
+def validate_file(cleaned_buf: io.BytesIO, merged_buf: io.BytesIO, year=None):
+    cleaned_df = read_required_columns(cleaned_buf)
+    merged_df = read_required_columns(merged_buf)
+
+    columns = set(cleaned_df.columns)
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in columns]
+    # without the key identity columns the rest of the checks can't say anything useful
+    if NON_NULL_COLS.intersection(missing_cols):
+        return [f"❌ Missing columns: {missing_cols}"]
+
+    # snapshot the frame once: dtypes, and which columns hold any nulls
+    dtypes = cleaned_df.dtypes.astype(str).to_dict()
+    has_nulls = cleaned_df.isna().any()
+
+    bad_rows = np.zeros(len(cleaned_df), dtype=bool)
+    null_errors = []
+    dtype_errors = []
+    for col in REQUIRED_COLUMNS:
+        if col not in columns:
+            continue
+
+        # Null checks + return row number
+        # (read_csv gives a RangeIndex, so row positions are the row numbers)
+        if col in NON_NULL_COLS and has_nulls[col]:
+            null_mask = cleaned_df[col].isna().to_numpy()
+            bad_rows |= null_mask
+            null_indices = np.flatnonzero(null_mask)
+            shown = null_indices[:MAX_REPORTED_ROWS].tolist()
+            more = f" ... ({len(null_indices)} total)" if len(null_indices) > MAX_REPORTED_ROWS else ""
+            null_errors.append(f"❌ Null values in column: {col} at rows: {shown}{more}")
+
+        # Dtype check
+        expected_dtype = EXPECTED_DTYPES.get(col)
+        if expected_dtype and dtypes[col] != expected_dtype:
+            dtype_errors.append(f"❌ {col} dtype mismatch: expected={expected_dtype}, actual={dtypes[col]}")
 
     errors = []
-
-    # find Missing columns
-    missing_cols = [col for col in REQUIRED_COLUMNS if col not in cleaned_df.columns]
     if missing_cols:
         errors.append(f"❌ Missing columns: {missing_cols}")
-
-    # Null checks + return row number
-    for col in NON_NULL_COLS:
-        if col in cleaned_df.columns:
-            null_indices = cleaned_df[cleaned_df[col].isnull()].index.tolist()
-            if null_indices:
-                errors.append(f"❌ Null values in column: {col} at rows: {null_indices}")
-
-    # Dtype check
-    for col, expected_dtype in EXPECTED_DTYPES.items():
-        if col in cleaned_df.columns:
-            actual_dtype = str(cleaned_df[col].dtype)
-            if actual_dtype != expected_dtype:
-                errors.append(f"❌ {col} dtype mismatch: expected={expected_dtype}, actual={actual_dtype}")
+    errors.extend(null_errors)
+    if year is not None and bad_rows.any():
+        # a failed write (e.g. a read-only service account) shouldn't cost us the findings above
+        try:
+            errors.append(f"📄 Rows with nulls written to {upload_error_rows(cleaned_df[bad_rows], year)}")
+        except Exception as e:
+            errors.append(f"⚠️ Could not write error rows: {e}")
+    errors.extend(dtype_errors)
 
     return errors
 
+def _validate_year(year, cleaned_blob, merged_blob, download_pool):
+    # the cleaned and merged downloads are independent, so fetch them side by side
+    cleaned_future = download_pool.submit(download_blob_to_buffer, cleaned_blob)
+    merged_future = download_pool.submit(download_blob_to_buffer, merged_blob)
+    return validate_file(cleaned_future.result(), merged_future.result(), year=year)
+
 if __name__ == "__main__":
-    cleaned_files = list_gcs_files(CLEANED_PREFIX)
-    merged_files = list_gcs_files(MERGED_PREFIX)
+    # the two prefix listings are independent round trips, so run them together
+    with ThreadPoolExecutor(max_workers=2) as list_pool:
+        cleaned_listing = list_pool.submit(list_gcs_files, CLEANED_PREFIX)
+        merged_listing = list_pool.submit(list_gcs_files, MERGED_PREFIX)
+    cleaned_files = cleaned_listing.result()
+    merged_files = merged_listing.result()
 
     # Match files by year
     cleaned_years = {
-        re.search(r"(\d{4})", Path(f).stem).group(1): f
-        for f in cleaned_files if re.search(r"(\d{4})", Path(f).stem)
+        m.group(1): f
+        for f in cleaned_files if (m := _YEAR4_RE.search(Path(f).stem))
     }
     merged_years = {
-        re.search(r"(\d{4})", Path(f).stem).group(1): f
-        for f in merged_files if re.search(r"(\d{4})", Path(f).stem)
+        m.group(1): f
+        for f in merged_files if (m := _YEAR4_RE.search(Path(f).stem))
     }
 
     matched_years = sorted(set(cleaned_years.keys()) & set(merged_years.keys()))
     print(f"📅 Found {len(matched_years)} matched years to validate: {matched_years}")
 
+    # years run concurrently; results are printed in year order as they are collected
+    # the download pool is entered first so it is shut down last, after every year has finished with it
+    with ThreadPoolExecutor(max_workers=2 * MAX_YEAR_WORKERS) as download_pool, \
+            ThreadPoolExecutor(max_workers=MAX_YEAR_WORKERS) as year_pool:
+        futures = {
+            year: year_pool.submit(_validate_year, year, cleaned_years[year], merged_years[year], download_pool)
+            for year in matched_years
+        }
+
     failed_files = []
     for year in matched_years:
         print(f"\n🔍 Validating year {year}...")
-        cleaned_local = download_blob_to_tempfile(cleaned_years[year])
-        merged_local = download_blob_to_tempfile(merged_years[year])
-        errors = validate_file(cleaned_local, merged_local)
+        try:
+            errors = futures[year].result()
+        except Exception as e:
+            errors = [f"❌ Could not validate year {year}: {e}"]
 
         if errors:
             print("\n".join(errors))
@@ -1,54 +1,46 @@
 # validate_merge.py
 
+import os
 import pandas as pd
 from pathlib import Path
 import argparse
-from clean_salary_data import standardize_column_names, normalize_text
-
-def load_csv_with_encoding(file_path):
-    """Load CSV file with appropriate encoding."""
-    encodings = ['utf-8', 'utf-8-sig', 'iso-8859-1', 'cp1252']
-    for encoding in encodings:
-        try:
-            return pd.read_csv(file_path, encoding=encoding)
-        except UnicodeDecodeError:
-            continue
-    raise ValueError(f"Could not read file {file_path} with any of the attempted encodings: {encodings}")
-
-def validate_merge(salary_path: Path, merged_path: Path, addendum_path: Path = None):
+from clean_salary_data import standardize_column_names, load_csv_with_encoding
+from merge_addendum import TEXT_COLUMN_DTYPES, build_keys
+
+# sample rows in the report are opt-in: formatting them costs more than the checks on small years
+VERBOSE = os.environ.get("VALIDATE_VERBOSE") == "1"
+
+# everything the checks and the report read; other columns are skipped at parse time
+VALIDATION_COLUMNS = [
+    "sector", "first_name", "last_name", "employer", "job_title",
+    "calendar_year", "salary_paid", "taxable_benefits", "status"
+]
+
+def load_validation_frame(source):
+    """Load one input with just the validated columns, under standardized names. DataFrames pass through."""
+    if isinstance(source, pd.DataFrame):
+        return source
+    df = load_csv_with_encoding(source, dtype=TEXT_COLUMN_DTYPES, usecols=VALIDATION_COLUMNS)
+    df, _ = standardize_column_names(df)
+    return df
+
+def validate_merge(salary_path: Path, merged_path: Path, addendum_path: Path = None, verbose: bool = None):
     """Validate that the merge was performed correctly"""
+    if verbose is None:
+        verbose = VERBOSE
     print("\n")
     print("Loading files...")
-    salary_df = load_csv_with_encoding(salary_path)
-    salary_df, _ = standardize_column_names(salary_df)
-    merged_df = load_csv_with_encoding(merged_path)
-    merged_df, _ = standardize_column_names(merged_df)
+    salary_df = load_validation_frame(salary_path)
+    merged_df = load_validation_frame(merged_path)
 
     # Early exit if no addendum exists
-    if addendum_path is None or not addendum_path.exists():
+    if addendum_path is None or (isinstance(addendum_path, Path) and not addendum_path.exists()):
         print("\nNo addendum found - no validation required (make sure raw files were properly DLed)")
         return True
 
     # continue if addendum exists
-    addendum_df = load_csv_with_encoding(addendum_path)
-    addendum_df, _ = standardize_column_names(addendum_df)
-    print(f" Salary rows: {len(salary_df)}")
-    print(f" Addendum rows: {len(addendum_df)}")
-    print(f" Merged rows: {len(merged_df)}")
-
-    def match_key(row):
-        return (
-            normalize_text(str(row.get("first_name", ""))),
-            normalize_text(str(row.get("last_name", ""))),
-            normalize_text(str(row.get("employer", ""))),
-            normalize_text(str(row.get("job_title", ""))),
-            row.get("calendar_year")
-        )
-
-    # Add match keys to all dataframes
-    addendum_df["_match_key"] = addendum_df.apply(match_key, axis=1)
-    salary_df["_match_key"] = salary_df.apply(match_key, axis=1)
-    merged_df["_match_key"] = merged_df.apply(match_key, axis=1)
+    addendum_df = load_validation_frame(addendum_path)
+    print(f" Salary rows: {len(salary_df)}\n Addendum rows: {len(addendum_df)}\n Merged rows: {len(merged_df)}")
 
     # Validate status column exists
     status_col = next((col for col in addendum_df.columns if col.lower().strip() == "status"), None)
@@ -62,53 +54,89 @@ def validate_merge(salary_path: Path, merged_path: Path, addendum_path: Path = N
     post_drop = pre_drop_len_add - len(addendum_df)
     print(f"\nDropped {post_drop} row(s) in addendum with null values")
 
+    # Lowercase each distinct status once; as a categorical, the filters below compare small integer codes
+    raw_status = addendum_df[status_col]
+    raw_uniques = raw_status.dropna().unique()
+    status_lc = raw_status.map(dict(zip(raw_uniques, (value.lower() for value in raw_uniques)))).astype("category")
+
     # Count rows in addendum by status
-    status_counts = addendum_df[status_col].str.lower().value_counts()
+    status_counts = status_lc.value_counts()
 
     print("\n🧾 Addendum Summary")
     print("=" * 20)
     print(f" Additions: {status_counts.get('addition', 0)}")
     print(f" Deletions: {status_counts.get('deletion', 0)}")
     print(f" Changes:   {status_counts.get('changed', 0)}")
-    
+
+    # statuses none of the checks below look at (e.g. blanks or unmapped synonyms)
+    unexpected_status = addendum_df[~status_lc.isin(['addition', 'deletion', 'changed'])]
+    if len(unexpected_status) > 0:
+        unexpected_values = sorted(unexpected_status[status_col].dropna().unique().tolist())
+        print(f" Unexpected status: {len(unexpected_status)} {unexpected_values}")
+
+    # Early exit if the addendum has nothing to apply
+    if status_counts.reindex(["addition", "deletion", "changed"], fill_value=0).sum() == 0:
+        print("\nNo additions, deletions or changes in addendum - no validation required")
+        return True
+
+    # Add match keys (the salary file only needs them for the change check below)
+    # assign() rather than setting a column: the frames may belong to the caller (or be a dropna slice)
+    addendum_df = addendum_df.assign(_match_key=build_keys(addendum_df))
+    merged_df = merged_df.assign(_match_key=build_keys(merged_df))
+
+    # every check below only looks at merged rows sharing a key with the addendum,
+    # so pick those out in one pass and run the per-status checks on that small frame
+    merged_hits = merged_df[merged_df["_match_key"].isin(pd.Index(addendum_df["_match_key"]).unique())]
+
     # Check each operation type
-    to_delete = addendum_df[addendum_df[status_col].str.lower() == 'deletion'].copy()
-    delete_keys = set(to_delete["_match_key"])
-    deletions_still_exist = merged_df[merged_df["_match_key"].isin(delete_keys)]
-
-    to_change = addendum_df[addendum_df[status_col].str.lower() == 'changed'].copy()
-    change_keys = set(to_change["_match_key"])
-
-    # find rows with same match key in both datasets
-    skipped_changes = to_change.merge(
-        salary_df,
-        on="_match_key",
-        suffixes=("_addendum", "_salary"),
-        how="inner"
-    )
-    
-    cols_to_compare = ["first_name", "last_name", "employer", "job_title", "calendar_year", "salary_paid", "taxable_benefits"]
-
-    # identical_rows_mask = pd series of boolean values where:
-    # True = the intended change (from to_change) is already reflected in the current salary data (salary_df)
-    # False = at least one of the compared columns has diff values between the "_addendum" and "_salary" versions for that row.
-    identical_rows_mask = skipped_changes.apply(
-        lambda row: all(
-            row[f"{col}_addendum"] == row[f"{col}_salary"] for col in cols_to_compare),
-        axis=1
-    )
+    to_delete = addendum_df[status_lc == 'deletion']
+    if len(to_delete) > 0:
+        delete_keys = pd.Index(to_delete["_match_key"])
+        deletions_still_exist = merged_hits[merged_hits["_match_key"].isin(delete_keys)]
+    else:
+        deletions_still_exist = merged_hits.iloc[:0]
+
+    to_change = addendum_df[status_lc == 'changed']
+    skipped_keys = pd.Index([])
+    changes_in_merged = merged_hits.iloc[:0]
+    if len(to_change) > 0:
+        salary_df = salary_df.assign(_match_key=build_keys(salary_df))
+        change_keys = pd.Index(to_change["_match_key"]).unique()
+
+        cols_to_compare = ["first_name", "last_name", "employer", "job_title", "calendar_year", "salary_paid", "taxable_benefits"]
+
+        # find rows with same match key in both datasets
+        # exact repeats in the salary file would only multiply the join, so collapse them first;
+        # distinct rows sharing a key are kept since any of them may already hold the change
+        # only the key and compared columns are read afterwards, so only those go through the join
+        needed = ["_match_key"] + cols_to_compare
+        skipped_changes = to_change[needed].merge(
+            salary_df[needed].drop_duplicates(),
+            on="_match_key",
+            suffixes=("_addendum", "_salary"),
+            how="inner"
+        )
+
+        # identical_rows_mask = pd series of boolean values where:
+        # True = the intended change (from to_change) is already reflected in the current salary data (salary_df)
+        # False = at least one of the compared columns has diff values between the "_addendum" and "_salary" versions for that row.
+        addendum_values = skipped_changes[[f"{col}_addendum" for col in cols_to_compare]].to_numpy()
+        salary_values = skipped_changes[[f"{col}_salary" for col in cols_to_compare]].to_numpy()
+        identical_rows_mask = (addendum_values == salary_values).all(axis=1)
 
-    # Get the keys of the identical/skipped rows
-    skipped_keys = set(skipped_changes[identical_rows_mask]["_match_key"])
-    change_keys = change_keys - skipped_keys
+        # Get the keys of the identical/skipped rows
+        # (kept as Index objects so isin hashes string arrays rather than a Python set)
+        skipped_keys = pd.Index(skipped_changes.loc[identical_rows_mask, "_match_key"]).unique()
+        change_keys = change_keys.difference(skipped_keys)
 
-    # Changes actually found in the merged data
-    changes_in_merged = merged_df[merged_df["_match_key"].isin(change_keys)]
+        # Changes actually found in the merged data
+        changes_in_merged = merged_hits[merged_hits["_match_key"].isin(change_keys)]
 
     # additions
-    to_add = addendum_df[addendum_df[status_col].str.lower() == 'addition'].copy()
-    add_keys = set(to_add["_match_key"])
-    additions_missing = to_add[~to_add["_match_key"].isin(merged_df["_match_key"])]
+    to_add = addendum_df[status_lc == 'addition']
+    # anti-join on the unique keys only, then pick out the addendum rows (duplicates included) still missing
+    missing_add_keys = pd.Index(to_add["_match_key"]).unique().difference(merged_hits["_match_key"])
+    additions_missing = to_add[to_add["_match_key"].isin(missing_add_keys)]
 
     print("\n📊 Validation Report")
     print("=" * 20)
@@ -116,7 +144,8 @@ def validate_merge(salary_path: Path, merged_path: Path, addendum_path: Path = N
     
     if len(deletions_still_exist) > 0:
         print(f"Deletion rows that still exist: {len(deletions_still_exist)}")
-        print(deletions_still_exist[["first_name", "last_name", "employer", "salary_paid"]].head(10))
+        if verbose:
+            print(deletions_still_exist[["first_name", "last_name", "employer", "salary_paid"]].head(10))
 
     if len(changes_in_merged) > 0:
         print(f"Confirmed {len(changes_in_merged)} valid 'changed' rows found in merged file.")
@@ -125,8 +154,9 @@ def validate_merge(salary_path: Path, merged_path: Path, addendum_path: Path = N
     if len(additions_missing) > 0:
         print(f"'Addition' rows in addendum: {len(to_add)}")
         print(f"'Addition' rows missing in merge: {len(additions_missing)}")
-        print("First few missing additions:")
-        print(additions_missing[["first_name", "last_name", "employer", "salary_paid"]].head(10))
+        if verbose:
+            print("First few missing additions:")
+            print(additions_missing[["first_name", "last_name", "employer", "salary_paid"]].head(10))
 
     # Final validation
     # change operation is not checked here because duplicates in salary/addendum are frequent causing false flags
@@ -147,8 +177,9 @@ if __name__ == "__main__":
     parser.add_argument("--salary", type=Path, required=True, help="Path to original salary file")
     parser.add_argument("--merged", type=Path, required=True, help="Path to merged output file")
     parser.add_argument("--addendum", type=Path, required=False, help="Path to addendum file")
+    parser.add_argument("--verbose", action="store_true", help="Print sample rows for failed checks (or set VALIDATE_VERBOSE=1)")
     args = parser.parse_args()
 
-    success = validate_merge(args.salary, args.merged, args.addendum)
+    success = validate_merge(args.salary, args.merged, args.addendum, verbose=args.verbose or VERBOSE)
     if not success:
         exit(1)
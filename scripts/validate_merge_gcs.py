@@ -1,32 +1,123 @@
 # validate_merge_gcs.py
 
+import io
+import os
 import re
+import hashlib
+import sys
+import threading
 import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 import argparse
-from google.cloud import storage
 
 # our modules
-from gcs_modules import download_gcs_file, gcs_blob_exists
-from validate_merge import validate_merge
+from gcs_modules import get_storage_client, parse_gcs_path, download_gcs_bytes, gcs_blob_exists, list_merged_files
+# pandas/pyarrow (via validate_merge and clean_salary_data) are imported by the functions that use them,
+# so --help and argument errors return before they load
 
-def list_merged_files(bucket, prefix="merged/"):
-    client = storage.Client()
-    blobs = client.list_blobs(bucket, prefix=prefix)
-    return [blob.name for blob in blobs if blob.name.endswith(".csv") and "merged_salary" in blob.name]
+MAX_YEAR_WORKERS = 8
+# each year fetches its salary, addendum and merged file side by side
+DOWNLOADS_PER_YEAR = 3
 
-def validate_all_merges(bucket_name):
-    merged_files = list_merged_files(bucket_name)
-    failed_validations = []
+_YEAR_RE = re.compile(r"(19\d{2}|20\d{2})")
+
+# parsed + standardized inputs, reused across runs while the blob's generation is unchanged
+PREPARED_CACHE_DIR = Path(tempfile.gettempdir()) / "validate_cache"
+# bump when load_validation_frame or the CSV loader changes what a prepared frame holds;
+# the column and dtype config is folded into the key as well
+PREPARED_CACHE_VERSION = 2
+
+@lru_cache(maxsize=None)
+def _prepared_config():
+    from validate_merge import VALIDATION_COLUMNS
+    from merge_addendum import TEXT_COLUMN_DTYPES
+    return hashlib.sha1(repr((
+        PREPARED_CACHE_VERSION,
+        VALIDATION_COLUMNS,
+        sorted((col, getattr(t, "__name__", str(t))) for col, t in TEXT_COLUMN_DTYPES.items())
+    )).encode()).hexdigest()[:16]
+
+_thread_output = threading.local()
+
+# set in each worker process by _init_worker
+_DOWNLOAD_POOL = None
+
+class _PerThreadStdout:
+    """sys.stdout stand-in that sends each worker thread's prints to its own buffer."""
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        return getattr(_thread_output, "buffer", self._stream).write(text)
+
+    def flush(self):
+        getattr(_thread_output, "buffer", self._stream).flush()
+
+def load_prepared(gcs_uri):
+    """Load a blob as validate_merge's standardized frame, via a local feather copy keyed on (uri, generation)."""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    from validate_merge import load_validation_frame
+    from clean_salary_data import arrow_to_pandas
+    bucket_name, blob_path = parse_gcs_path(gcs_uri)
+    blob = get_storage_client().bucket(bucket_name).get_blob(blob_path)
+    if blob is None:
+        raise FileNotFoundError(f"Blob not found: {gcs_uri}")
+
+    # files are named <uri>-<generation + prepare config>: a re-uploaded blob or a change in how
+    # frames are prepared gives a new name, so stale copies are never read
+    uri_key = hashlib.sha1(gcs_uri.encode()).hexdigest()[:16]
+    version_key = hashlib.sha1(f"{blob.generation}#{_prepared_config()}".encode()).hexdigest()[:16]
+    cache_file = PREPARED_CACHE_DIR / f"{uri_key}-{version_key}.feather"
+    if cache_file.exists():
+        print(f"> Using cached {blob_path}")
+        return arrow_to_pandas(feather.read_table(cache_file))
+
+    # pinned to the generation in the cache key, so a re-upload in between can't be cached under the old one
+    df = load_validation_frame(download_gcs_bytes(gcs_uri, generation=blob.generation))
+    try:
+        PREPARED_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # drop this blob's older copies, plus any left from before files were named per blob
+        for old_file in PREPARED_CACHE_DIR.glob("*.feather"):
+            if old_file.name.startswith(f"{uri_key}-") or "-" not in old_file.name:
+                old_file.unlink(missing_ok=True)
+        # write then rename, so a concurrent reader never sees a half-written file
+        partial_file = cache_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        df.to_feather(partial_file)
+        partial_file.replace(cache_file)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OSError) as e:
+        print(f"> Not caching {blob_path}: {e}")
+    return df
 
-    for merged_blob_path in merged_files:
+def _submit_with_output(pool, fn, *args):
+    # run fn on another thread but print into the submitting thread's buffer
+    buffer = _thread_output.buffer
+    def run():
+        _thread_output.buffer = buffer
+        try:
+            return fn(*args)
+        finally:
+            del _thread_output.buffer
+    return pool.submit(run)
+
+def _load_addendum(addendum_uri):
+    return load_prepared(addendum_uri) if gcs_blob_exists(addendum_uri) else None
+
+def validate_year(bucket_name, merged_blob_path, download_pool):
+    """Validate one merged file; returns (captured output, passed)."""
+    from validate_merge import validate_merge
+    _thread_output.buffer = io.StringIO()
+    try:
         print("\n")
         print("=" * 100)
         print(f"🔍 Validating {merged_blob_path}...")
-        year_match = re.search(r"(19\d{2}|20\d{2})", merged_blob_path)
+        year_match = _YEAR_RE.search(merged_blob_path)
         if not year_match:
             print("Year not found in blob name; skipping.")
-            continue
+            return _thread_output.buffer.getvalue(), True
         year = year_match.group(1)
 
         salary_uri = f"gs://{bucket_name}/raw/salaries/sunshine_salaries_{year}.csv"
@@ -34,16 +125,16 @@ def validate_all_merges(bucket_name):
         merged_uri = f"gs://{bucket_name}/{merged_blob_path}"
 
         try:
-            # check addendum exists
-            addendum_exists = gcs_blob_exists(addendum_uri)
-
-            merged_local = download_gcs_file(merged_uri)
-            salary_local = download_gcs_file(salary_uri)
+            # the three inputs are independent, so fetch them side by side;
+            # each is read into memory (or from the prepared cache), a temp file is just extra disk I/O
+            merged_future = _submit_with_output(download_pool, load_prepared, merged_uri)
+            salary_future = _submit_with_output(download_pool, load_prepared, salary_uri)
+            addendum_future = _submit_with_output(download_pool, _load_addendum, addendum_uri)
+            merged_local = merged_future.result()
+            salary_local = salary_future.result()
 
-            addendum_local = None
-            if addendum_exists:
-                addendum_local = download_gcs_file(addendum_uri)
-            else:
+            addendum_local = addendum_future.result()
+            if addendum_local is None:
                 print(f"No addendum found for {year}, no validation necessary")
                 
             success = validate_merge(
@@ -51,13 +142,44 @@ def validate_all_merges(bucket_name):
                 merged_path=merged_local,
                 addendum_path=addendum_local
             )
-            
-            if not success:
-                failed_validations.append(merged_blob_path)
 
         except Exception as e:
             print("\n")
             print(f"❌ Error processing {merged_blob_path}: {e}")
+            success = False
+
+        return _thread_output.buffer.getvalue(), success
+    finally:
+        del _thread_output.buffer
+
+def _init_worker():
+    """Per-process setup: buffered stdout and a download pool. The storage client is built lazily here, never inherited."""
+    global _DOWNLOAD_POOL
+    sys.stdout = _PerThreadStdout(sys.stdout)
+    _DOWNLOAD_POOL = ThreadPoolExecutor(max_workers=DOWNLOADS_PER_YEAR)
+
+def _validate_year_task(task):
+    bucket_name, merged_blob_path = task
+    return validate_year(bucket_name, merged_blob_path, _DOWNLOAD_POOL)
+
+def validate_all_merges(bucket_name):
+    merged_files = list_merged_files(bucket_name)
+    failed_validations = []
+
+    # years are independent and the pandas checks hold the GIL, so each year runs in its own process;
+    # spawn keeps the storage client's sockets out of the workers, and each year's output is
+    # returned whole and printed in file order
+    workers = max(1, min(os.cpu_count() or 1, len(merged_files), MAX_YEAR_WORKERS))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker
+    ) as pool:
+        results = list(pool.map(_validate_year_task, [(bucket_name, path) for path in merged_files]))
+
+    for merged_blob_path, (output, success) in zip(merged_files, results):
+        print(output, end="")
+        if not success:
             failed_validations.append(merged_blob_path)
 
     print("\n====== SUMMARY ======")